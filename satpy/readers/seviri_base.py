@@ -17,6 +17,15 @@
 # satpy.  If not, see <http://www.gnu.org/licenses/>.
 """Utilities and helper classes for MSG HRIT/Native data reading.
 
+The 10-bit decoding and the fused decode/calibration kernels in this
+module use numba when it is installed (``pip install satpy[seviri_l1b_native]``)
+and fall back to equivalent numpy implementations otherwise. The numba
+kernels are compiled on first use and cached on disk (``cache=True``),
+so only the very first call in a fresh environment pays the compilation
+cost; short-lived batch processes reuse the cached machine code. If
+satpy is installed to a read-only location, point ``NUMBA_CACHE_DIR``
+at a writable directory to keep the cache effective.
+
 References:
     MSG Level 1.5 Image Data Format Description
     https://www.eumetsat.int/website/wcm/idc/idcplg?IdcService=GET_FILE&dDocName=PDF_TEN_05105_MSG_IMG_DATA&RevisionSelectionMethod=LatestReleased&Rendition=Web
@@ -27,6 +36,11 @@ import numpy as np
 from numpy.polynomial.chebyshev import Chebyshev
 import dask.array as da
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 from satpy.readers.eum_base import (time_cds_short,
                                     issue_revision)
 
@@ -233,6 +247,49 @@ def get_cds_time(days, msecs):
     return time
 
 
+def _dec10216_numpy(inbuf):
+    """Decode 10-bit data into 16-bit words using plain numpy."""
+    arr10 = inbuf.astype(np.uint16)
+    arr10_len = (len(arr10) // 5) * 5
+    arr10 = arr10[:arr10_len]  # ignore trailing incomplete group
+
+    arr10_0 = arr10[::5]
+    arr10_1 = arr10[1::5]
+    arr10_2 = arr10[2::5]
+    arr10_3 = arr10[3::5]
+    arr10_4 = arr10[4::5]
+
+    arr16_0 = (arr10_0 << 2) + (arr10_1 >> 6)
+    arr16_1 = ((arr10_1 & 63) << 4) + (arr10_2 >> 4)
+    arr16_2 = ((arr10_2 & 15) << 6) + (arr10_3 >> 2)
+    arr16_3 = ((arr10_3 & 3) << 8) + arr10_4
+
+    return np.stack([arr16_0, arr16_1, arr16_2, arr16_3], axis=-1).ravel()
+
+
+if numba is not None:
+    @numba.njit(parallel=True, nogil=True, cache=True)
+    def _dec10216(inbuf):
+        """Decode 10-bit data into 16-bit words, 5 bytes to 4 words per group."""
+        n_groups = inbuf.size // 5
+        arr16 = np.empty(n_groups * 4, dtype=np.uint16)
+        # A stride of one group per iteration lets LLVM vectorize the
+        # shift/mask pattern across groups.
+        for i in numba.prange(n_groups):
+            b0 = np.uint16(inbuf[i * 5])
+            b1 = np.uint16(inbuf[i * 5 + 1])
+            b2 = np.uint16(inbuf[i * 5 + 2])
+            b3 = np.uint16(inbuf[i * 5 + 3])
+            b4 = np.uint16(inbuf[i * 5 + 4])
+            arr16[i * 4] = (b0 << 2) | (b1 >> 6)
+            arr16[i * 4 + 1] = ((b1 & 0x3F) << 4) | (b2 >> 4)
+            arr16[i * 4 + 2] = ((b2 & 0x0F) << 6) | (b3 >> 2)
+            arr16[i * 4 + 3] = ((b3 & 0x03) << 8) | b4
+        return arr16
+else:
+    _dec10216 = _dec10216_numpy
+
+
 def dec10216(inbuf):
     """Decode 10 bits data into 16 bits words.
 
@@ -252,27 +309,129 @@ def dec10216(inbuf):
         op[2] = (ip[2] & 0x0F)*64 + ip[3]/4;
         op[3] = (ip[3] & 0x03)*256 +ip[4];
 
+    Accepts arrays of any shape; the bytes are decoded in flattened
+    order, so callers don't need to flatten (and thereby copy or
+    rechunk) their input first.
     """
-    arr10 = inbuf.astype(np.uint16)
-    arr16_len = int(len(arr10) * 4 / 5)
-    arr10_len = int((arr16_len * 5) / 4)
-    arr10 = arr10[:arr10_len]  # adjust size
-
-    # dask is slow with indexing
-    arr10_0 = arr10[::5]
-    arr10_1 = arr10[1::5]
-    arr10_2 = arr10[2::5]
-    arr10_3 = arr10[3::5]
-    arr10_4 = arr10[4::5]
+    if isinstance(inbuf, da.Array):
+        if inbuf.ndim > 1:
+            inbuf = inbuf.reshape(-1)
+        # decode each chunk on its own; all chunks but the last must hold
+        # whole 5-byte groups for the group boundaries to line up
+        if any(size % 5 != 0 for size in inbuf.chunks[0][:-1]):
+            inbuf = inbuf.rechunk(inbuf.shape[0])
+        chunks = (tuple(size // 5 * 4 for size in inbuf.chunks[0]),)
+        return inbuf.map_blocks(_dec10216, dtype=np.uint16, chunks=chunks)
+
+    return _dec10216(np.ascontiguousarray(inbuf).reshape(-1))
+
+
+# Calibration modes understood by the fused unpack-and-calibrate kernel
+CAL_COUNTS = 0
+CAL_RADIANCE = 1
+CAL_REFLECTANCE = 2
+CAL_BT_SPECTRAL = 3
+CAL_BT_EFFECTIVE = 4
+
+
+def _unpack_and_calibrate_numpy(inbuf, gain, offset, mode, coefs):
+    """Decode packed 10-bit lines and calibrate them with numpy."""
+    counts = _dec10216_numpy(inbuf.ravel())
+    data = counts.astype(np.float32)
+    data[counts == 0] = np.nan
+    if mode != CAL_COUNTS:
+        data = np.clip(data * np.float32(gain) + np.float32(offset),
+                       0.0, None)
+    if mode == CAL_REFLECTANCE:
+        data = data * np.float32(100.0 / coefs[0])
+    elif mode in (CAL_BT_SPECTRAL, CAL_BT_EFFECTIVE):
+        vc = coefs[0]
+        temp = ((C2 * vc) /
+                np.log((1.0 / data) * C1 * vc ** 3 + 1.0)).astype(np.float32)
+        if mode == CAL_BT_SPECTRAL:
+            data = (coefs[1] * temp * temp +
+                    coefs[2] * temp + coefs[3]).astype(np.float32)
+        else:
+            data = ((temp - coefs[2]) / coefs[1]).astype(np.float32)
+    return data.reshape((inbuf.shape[0], inbuf.shape[1] // 5 * 4))
+
+
+if numba is not None:
+    @numba.njit(nogil=True, cache=True, inline='always')
+    def _calibrate_sample(raw, gain, offset, mode, coefs):
+        """Calibrate a single 10-bit count."""
+        if raw == 0:
+            return np.float32(np.nan)
+        if mode == CAL_COUNTS:
+            return np.float32(raw)
+        rad = gain * raw + offset
+        if rad < 0.0:
+            rad = 0.0
+        if mode == CAL_RADIANCE:
+            return np.float32(rad)
+        if mode == CAL_REFLECTANCE:
+            return np.float32(rad * 100.0 / coefs[0])
+        vc = coefs[0]
+        temp = (C2 * vc) / np.log((1.0 / rad) * C1 * vc ** 3 + 1.0)
+        if mode == CAL_BT_SPECTRAL:
+            return np.float32(coefs[1] * temp * temp +
+                              coefs[2] * temp + coefs[3])
+        return np.float32((temp - coefs[2]) / coefs[1])
+
+    @numba.njit(parallel=True, nogil=True, cache=True)
+    def _unpack_and_calibrate(inbuf, gain, offset, mode, coefs):
+        """Decode packed 10-bit lines and calibrate them in a single pass."""
+        n_lines, n_bytes = inbuf.shape
+        out = np.empty((n_lines, n_bytes // 5 * 4), dtype=np.float32)
+        for line in numba.prange(n_lines):
+            for i in range(n_bytes // 5):
+                b0 = np.uint16(inbuf[line, i * 5])
+                b1 = np.uint16(inbuf[line, i * 5 + 1])
+                b2 = np.uint16(inbuf[line, i * 5 + 2])
+                b3 = np.uint16(inbuf[line, i * 5 + 3])
+                b4 = np.uint16(inbuf[line, i * 5 + 4])
+                out[line, i * 4] = _calibrate_sample(
+                    (b0 << 2) | (b1 >> 6), gain, offset, mode, coefs)
+                out[line, i * 4 + 1] = _calibrate_sample(
+                    ((b1 & 0x3F) << 4) | (b2 >> 4), gain, offset, mode, coefs)
+                out[line, i * 4 + 2] = _calibrate_sample(
+                    ((b2 & 0x0F) << 6) | (b3 >> 2), gain, offset, mode, coefs)
+                out[line, i * 4 + 3] = _calibrate_sample(
+                    ((b3 & 0x03) << 8) | b4, gain, offset, mode, coefs)
+        return out
+else:
+    _unpack_and_calibrate = _unpack_and_calibrate_numpy
+
+
+def unpack_and_calibrate(inbuf, gain, offset, mode, coefs):
+    """Decode packed 10-bit line data and calibrate it in one pass.
+
+    Counts of zero (fill) become NaN. Instead of chaining a decode, a
+    mask and one xarray operation per calibration step -- each a full
+    pass over the image -- the samples are read once and written once as
+    calibrated float32 values.
 
-    arr16_0 = (arr10_0 << 2) + (arr10_1 >> 6)
-    arr16_1 = ((arr10_1 & 63) << 4) + (arr10_2 >> 4)
-    arr16_2 = ((arr10_2 & 15) << 6) + (arr10_3 >> 2)
-    arr16_3 = ((arr10_3 & 3) << 8) + arr10_4
-    arr16 = da.stack([arr16_0, arr16_1, arr16_2, arr16_3], axis=-1).ravel()
-    arr16 = da.rechunk(arr16, arr16.shape[0])
+    Args:
+        inbuf: Packed 10-bit data, one line of 5-byte groups per row
+        gain: Calibration gain (ignored for ``CAL_COUNTS``)
+        offset: Calibration offset (ignored for ``CAL_COUNTS``)
+        mode: One of the ``CAL_*`` calibration modes
+        coefs: Extra coefficients as a float array: the solar irradiance
+            for ``CAL_REFLECTANCE``, ``(vc, a, b, c)`` for
+            ``CAL_BT_SPECTRAL`` and ``(vc, alpha, beta)`` for
+            ``CAL_BT_EFFECTIVE``
 
-    return arr16
+    """
+    gain = float(gain)
+    offset = float(offset)
+    coefs = np.asarray(coefs, dtype=np.float64)
+    if isinstance(inbuf, da.Array):
+        chunks = (inbuf.chunks[0],
+                  tuple(size // 5 * 4 for size in inbuf.chunks[1]))
+        return inbuf.map_blocks(_unpack_and_calibrate, gain, offset, mode,
+                                coefs, dtype=np.float32, chunks=chunks)
+    return _unpack_and_calibrate(np.ascontiguousarray(inbuf),
+                                 gain, offset, mode, coefs)
 
 
 class MpefProductHeader(object):
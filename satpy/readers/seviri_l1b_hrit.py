@@ -757,9 +757,10 @@ class HRITMSGFileHandler(HRITFileHandler, SEVIRICalibrationHandler):
             gain = self.ext_calib_coefs.get(self.channel_name, {}).get('gain', int_gain)
             offset = self.ext_calib_coefs.get(self.channel_name, {}).get('offset', int_offset)
 
-            # Convert to radiance
-            data = data.where(data > 0)
-            res = self._convert_to_radiance(data.astype(np.float32), gain, offset)
+            # Convert to radiance, casting before masking so the masked
+            # image is float32 instead of a float64 temporary
+            data = data.astype(np.float32).where(data > 0)
+            res = self._convert_to_radiance(data, float(gain), float(offset))
             line_mask = self.mda['image_segment_line_quality']['line_validity'] >= 2
             line_mask &= self.mda['image_segment_line_quality']['line_validity'] <= 3
             line_mask &= self.mda['image_segment_line_quality']['line_radiometric_quality'] == 4
@@ -26,6 +26,7 @@ References:
 """
 
 import logging
+import mmap
 from datetime import datetime
 import numpy as np
 
@@ -39,16 +40,21 @@ from pyresample import geometry
 from satpy.readers.file_handlers import BaseFileHandler
 from satpy.readers.eum_base import recarray2dict
 from satpy.readers.seviri_base import (SEVIRICalibrationHandler,
-                                       CHANNEL_NAMES, CALIB, SATNUM,
-                                       dec10216, VISIR_NUM_COLUMNS,
-                                       VISIR_NUM_LINES, HRV_NUM_COLUMNS,
-                                       VIS_CHANNELS)
+                                       CHANNEL_NAMES, CALIB, SATNUM, BTFIT,
+                                       unpack_and_calibrate, CAL_COUNTS,
+                                       CAL_RADIANCE, CAL_REFLECTANCE,
+                                       CAL_BT_SPECTRAL, CAL_BT_EFFECTIVE,
+                                       VISIR_NUM_COLUMNS, VISIR_NUM_LINES,
+                                       HRV_NUM_COLUMNS, VIS_CHANNELS)
 from satpy.readers.seviri_l1b_native_hdr import (GSDTRecords, native_header,
                                                  native_trailer)
 from satpy.readers._geos_area import get_area_definition
 
 logger = logging.getLogger('native_msg')
 
+CALIB_MODE_NOMINAL = 0
+CALIB_MODE_GSICS = 1
+
 
 class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
     """SEVIRI native format reader.
@@ -56,15 +62,43 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
     The Level1.5 Image data calibration method can be changed by adding the
     required mode to the Scene object instantiation  kwargs eg
     kwargs = {"calib_mode": "gsics",}
+
+    The calibrated data are returned as float32 by default. Since the
+    raw counts only carry 10 bits of precision, ``output_dtype`` can be
+    set to ``"float16"`` (~3 significant digits) to halve the memory
+    traffic of downstream resampling and compositing, eg
+    kwargs = {"output_dtype": "float16",}
     """
 
-    def __init__(self, filename, filename_info, filetype_info, calib_mode='nominal'):
+    def __init__(self, filename, filename_info, filetype_info,
+                 calib_mode='nominal', output_dtype=np.float32):
         """Initialize the reader."""
         super(NativeMSGFileHandler, self).__init__(filename,
                                                    filename_info,
                                                    filetype_info)
         self.platform_name = None
         self.calib_mode = calib_mode
+        self.output_dtype = np.dtype(output_dtype)
+
+        # normalize the calibration mode once instead of re-comparing
+        # strings on every calibrate call
+        try:
+            self._calib_mode = {'nominal': CALIB_MODE_NOMINAL,
+                                'gsics': CALIB_MODE_GSICS}[calib_mode.lower()]
+        except KeyError:
+            raise NotImplementedError(
+                'Unknown Calibration mode : Please check')
+
+        # channel name -> position in the full channel list; the header
+        # carries calibration coefficients for all twelve channels
+        # whether or not they are present in the file
+        self._channel_index = {name: i for i, name
+                               in enumerate(CHANNEL_NAMES.values())}
+        # calibration parameters resolved from the header, per channel
+        # and calibration
+        self._calib_params = {}
+        # decoded dask arrays shared between sibling get_dataset calls
+        self._dataset_cache = {}
 
         # Declare required variables.
         # Assume a full disk file, reset in _read_header if otherwise.
@@ -73,10 +107,12 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
         self.mda['is_full_disk'] = True
         self.trailer = {}
 
-        # Read header, prepare dask-array, read trailer
+        # Map the file once; the header, the line records and the
+        # trailer are all decoded from views of the same mapping.
         # Available channels are known only after the header has been read
+        self._memmap = self._get_memmap()
         self._read_header()
-        self.dask_array = da.from_array(self._get_memmap(), chunks=(CHUNK_SIZE,))
+        self.line_data = self._get_line_data()
         self._read_trailer()
 
     @property
@@ -97,12 +133,14 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
         # For Earth model 2 and full disk VISIR, (center_point - west - 0.5 + we_offset) must be -1856.5 .
         # See MSG Level 1.5 Image Data Format Description Figure 7 - Alignment and numbering of the non-HRV pixels.
 
-        ll_c = (center_point - east + 0.5 + we_offset) * column_step
-        ll_l = (north - center_point + 0.5 + ns_offset) * line_step
-        ur_c = (center_point - west - 0.5 + we_offset) * column_step
-        ur_l = (south - center_point - 0.5 + ns_offset) * line_step
+        # (ll_c, ll_l, ur_c, ur_l)
+        corners = np.array([center_point - east + 0.5 + we_offset,
+                            north - center_point + 0.5 + ns_offset,
+                            center_point - west - 0.5 + we_offset,
+                            south - center_point - 0.5 + ns_offset])
+        steps = np.array([column_step, line_step, column_step, line_step])
 
-        return (ll_c, ll_l, ur_c, ur_l)
+        return tuple(corners * steps)
 
     def _get_data_dtype(self):
         """Get the dtype of the file based on the actual available channels."""
@@ -130,32 +168,83 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
             return lrec
 
         # each pixel is 10-bits -> one line of data has 25% more bytes
-        # than the number of columns suggest (10/8 = 1.25)
-        visir_rec = get_lrec(int(self.mda['number_of_columns'] * 1.25))
+        # than the number of columns suggest (10/8 = 1.25); round up in
+        # exact integer arithmetic rather than truncating a float
+        visir_rec = get_lrec((self.mda['number_of_columns'] * 10 + 7) // 8)
         number_of_visir_channels = len(
             [s for s in self.mda['channel_list'] if not s == 'HRV'])
         drec = [('visir', (visir_rec, number_of_visir_channels))]
 
         if self.mda['available_channels']['HRV']:
-            hrv_rec = get_lrec(int(self.mda['hrv_number_of_columns'] * 1.25))
+            hrv_rec = get_lrec((self.mda['hrv_number_of_columns'] * 10 + 7) // 8)
             drec.append(('hrv', (hrv_rec, 3)))
 
         return np.dtype(drec)
 
     def _get_memmap(self):
-        """Get the memory map for the SEVIRI data."""
-        with open(self.filename) as fp:
-            data_dtype = self._get_data_dtype()
-            hdr_size = native_header.itemsize
+        """Get a raw uint8 memory map of the whole file."""
+        raw = np.memmap(self.filename, dtype=np.uint8, mode="r")
+        try:
+            # the data is decoded in file order, so let the kernel
+            # prefetch aggressively
+            raw._mmap.madvise(mmap.MADV_SEQUENTIAL)
+            raw._mmap.madvise(mmap.MADV_WILLNEED)
+        except AttributeError:
+            # mmap.madvise needs python 3.8 and OS support
+            pass
+        return raw
+
+    def _get_line_data(self):
+        """Get contiguous per-channel views of the packed line data.
+
+        The file interleaves the channels line by line, each line record
+        carrying a packet header and line metadata in front of the packed
+        pixels (an array-of-structures layout). Slicing the packed pixels
+        for each channel out of a flat uint8 view of the records gives the
+        10-bit decoder one contiguous buffer per channel instead of a
+        strided gather across the structured dtype.
+        """
+        data_dtype = self._data_dtype
+        hdr_size = native_header.itemsize
+        data_size = self.mda['number_of_lines'] * data_dtype.itemsize
+        raw = self._memmap[hdr_size:hdr_size + data_size].reshape(
+            (self.mda['number_of_lines'], data_dtype.itemsize))
+        line_data = {}
+
+        def get_channel_views(field, nchannels):
+            rec_dtype, base_offset = data_dtype.fields[field]
+            rec_size = rec_dtype.base.itemsize
+            ld_dtype, ld_offset = rec_dtype.base.fields['line_data']
+            return [raw[:, base_offset + i * rec_size + ld_offset:
+                        base_offset + i * rec_size + ld_offset + ld_dtype.itemsize]
+                    for i in range(nchannels)]
+
+        visir_channels = [ch for ch in self.mda['channel_list']
+                          if ch != 'HRV']
+        views = get_channel_views('visir', len(visir_channels))
+        for channel, view in zip(visir_channels, views):
+            # name=False stops dask from hashing the memory-mapped data,
+            # which would read the whole file at open time
+            line_data[channel] = da.from_array(view, chunks=(CHUNK_SIZE, -1),
+                                               name=False)
 
-            return np.memmap(fp, dtype=data_dtype,
-                             shape=(self.mda['number_of_lines'],),
-                             offset=hdr_size, mode="r")
+        if self.mda['available_channels']['HRV']:
+            # each line record carries three HRV records holding three
+            # consecutive image lines, so interleaving them per line
+            # yields the packed image rows already in output order
+            views = get_channel_views('hrv', 3)
+            line_data['HRV'] = da.stack(
+                [da.from_array(view, chunks=(CHUNK_SIZE, -1), name=False)
+                 for view in views],
+                axis=1).reshape((3 * self.mda['number_of_lines'],
+                                 views[0].shape[1]))
+
+        return line_data
 
     def _read_header(self):
         """Read the header info."""
-        data = np.fromfile(self.filename,
-                           dtype=native_header, count=1)
+        data = np.frombuffer(self._memmap[:native_header.itemsize],
+                             dtype=native_header, count=1)
 
         self.header.update(recarray2dict(data))
 
@@ -164,8 +253,9 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
 
         # Set the list of available channels:
         self.mda['available_channels'] = get_available_channels(self.header)
-        self.mda['channel_list'] = [i for i in CHANNEL_NAMES.values()
-                                    if self.mda['available_channels'][i]]
+        self.mda['channel_list'] = [channel for channel, available
+                                    in self.mda['available_channels'].items()
+                                    if available]
 
         self.platform_id = data15hd[
             'SatelliteStatus']['SatelliteDefinition']['SatelliteId']
@@ -230,15 +320,20 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
         self.mda['hrv_number_of_lines'] = int(sec15hd["NumberLinesHRV"]['Value'])
         self.mda['hrv_number_of_columns'] = cols_hrv
 
+        # the data dtype is fully determined by the header, so build it
+        # once and share it between the memmap and the trailer offset
+        self._data_dtype = self._get_data_dtype()
+
     def _read_trailer(self):
 
         hdr_size = native_header.itemsize
-        data_size = (self._get_data_dtype().itemsize *
+        data_size = (self._data_dtype.itemsize *
                      self.mda['number_of_lines'])
+        trailer_offset = hdr_size + data_size
 
-        with open(self.filename) as fp:
-            fp.seek(hdr_size + data_size)
-            data = np.fromfile(fp, dtype=native_trailer, count=1)
+        data = np.frombuffer(
+            self._memmap[trailer_offset:trailer_offset + native_trailer.itemsize],
+            dtype=native_trailer, count=1)
 
         self.trailer.update(recarray2dict(data))
 
@@ -414,54 +509,116 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
         """Get the dataset."""
         if dataset_id['name'] not in self.mda['channel_list']:
             raise KeyError('Channel % s not available in the file' % dataset_id['name'])
-        elif dataset_id['name'] not in ['HRV']:
-            shape = (self.mda['number_of_lines'], self.mda['number_of_columns'])
 
-            # Check if there is only 1 channel in the list as a change
-            # is needed in the arrray assignment ie channl id is not present
-            if len(self.mda['channel_list']) == 1:
-                raw = self.dask_array['visir']['line_data']
-            else:
-                i = self.mda['channel_list'].index(dataset_id['name'])
-                raw = self.dask_array['visir']['line_data'][:, i, :]
+        dataset = xr.DataArray(self._get_channel_data(dataset_id),
+                               dims=['y', 'x'])
+        dataset.attrs['units'] = dataset_info['units']
+        dataset.attrs['wavelength'] = dataset_info['wavelength']
+        dataset.attrs['standard_name'] = dataset_info['standard_name']
+        dataset.attrs['platform_name'] = self.mda['platform_name']
+        dataset.attrs['sensor'] = 'seviri'
+        dataset.attrs['orbital_parameters'] = {
+            'projection_longitude': self.mda['projection_parameters']['ssp_longitude'],
+            'projection_latitude': 0.,
+            'projection_altitude': self.mda['projection_parameters']['h']}
 
-            data = dec10216(raw.flatten())
-            data = data.reshape(shape)
+        return dataset
 
-        else:
-            shape = (self.mda['hrv_number_of_lines'], self.mda['hrv_number_of_columns'])
+    def _get_channel_data(self, dataset_id):
+        """Return the decoded and calibrated dask array for a dataset.
 
-            raw2 = self.dask_array['hrv']['line_data'][:, 2, :]
-            raw1 = self.dask_array['hrv']['line_data'][:, 1, :]
-            raw0 = self.dask_array['hrv']['line_data'][:, 0, :]
+        The arrays are cached per channel and calibration so that sibling
+        ``get_dataset`` calls of a multi-channel Scene share one dask graph
+        and each line record is decoded only once per computation.
+        """
+        key = (dataset_id['name'], dataset_id['calibration'])
+        try:
+            return self._dataset_cache[key]
+        except KeyError:
+            pass
+
+        # Decoding the 10-bit counts, masking the zero (fill) counts and
+        # calibrating are fused into a single pass over each dask chunk
+        gain, offset, mode, coefs = self._get_calibration_params(dataset_id)
+
+        # the HRV lines are stored pre-interleaved by _get_line_data, so
+        # all channels decode the same way
+        data = unpack_and_calibrate(self.line_data[dataset_id['name']],
+                                    gain, offset, mode, coefs)
+        if data.dtype != self.output_dtype:
+            data = data.astype(self.output_dtype)
+
+        self._dataset_cache[key] = data
+        return data
+
+    def _get_calibration_params(self, dataset_id):
+        """Resolve a dataset's calibration to fused-kernel parameters.
+
+        The parameters are looked up in the header once per channel and
+        calibration and cached for the lifetime of the handler.
+        """
+        data15hdr = self.header['15_DATA_HEADER']
+        calibration = dataset_id['calibration']
+        channel = dataset_id['name']
+
+        try:
+            return self._calib_params[(channel, calibration)]
+        except KeyError:
+            pass
 
-            shape_layer = (self.mda['number_of_lines'], self.mda['hrv_number_of_columns'])
-            data2 = dec10216(raw2.flatten())
-            data2 = data2.reshape(shape_layer)
-            data1 = dec10216(raw1.flatten())
-            data1 = data1.reshape(shape_layer)
-            data0 = dec10216(raw0.flatten())
-            data0 = data0.reshape(shape_layer)
+        i = self._channel_index[channel]
 
-            data = np.stack((data0, data1, data2), axis=1).reshape(shape)
+        gain = 1.0
+        offset = 0.0
+        coefs = np.zeros(4)
 
-        xarr = xr.DataArray(data, dims=['y', 'x']).where(data != 0).astype(np.float32)
+        if calibration == 'counts':
+            params = (gain, offset, CAL_COUNTS, coefs)
+            self._calib_params[(channel, calibration)] = params
+            return params
 
-        if xarr is None:
-            dataset = None
+        if calibration not in ['radiance', 'reflectance', 'brightness_temperature']:
+            raise NotImplementedError(
+                'Unknown calibration %s' % calibration)
+
+        # NB GSICS doesn't have calibration coeffs for VIS channels
+        if (self._calib_mode != CALIB_MODE_GSICS or channel in VIS_CHANNELS):
+            coeffs = data15hdr[
+                'RadiometricProcessing']['Level15ImageCalibration']
+            gain = coeffs['CalSlope'][i]
+            offset = coeffs['CalOffset'][i]
+        else:
+            coeffs = data15hdr[
+                'RadiometricProcessing']['MPEFCalFeedback']
+            gain = coeffs['GSICSCalCoeff'][i]
+            offset = coeffs['GSICSOffsetCount'][i]
+            offset = offset * gain
+
+        if calibration == 'radiance':
+            mode = CAL_RADIANCE
+        elif calibration == 'reflectance':
+            mode = CAL_REFLECTANCE
+            coefs[0] = CALIB[self.platform_id][channel]["F"]
         else:
-            dataset = self.calibrate(xarr, dataset_id)
-            dataset.attrs['units'] = dataset_info['units']
-            dataset.attrs['wavelength'] = dataset_info['wavelength']
-            dataset.attrs['standard_name'] = dataset_info['standard_name']
-            dataset.attrs['platform_name'] = self.mda['platform_name']
-            dataset.attrs['sensor'] = 'seviri'
-            dataset.attrs['orbital_parameters'] = {
-                'projection_longitude': self.mda['projection_parameters']['ssp_longitude'],
-                'projection_latitude': 0.,
-                'projection_altitude': self.mda['projection_parameters']['h']}
+            cal_type = data15hdr['ImageDescription'][
+                'Level15ImageProduction']['PlannedChanProcessing'][i]
+            if cal_type == 1:
+                # spectral radiances
+                mode = CAL_BT_SPECTRAL
+                coefs[0] = CALIB[self.platform_id][channel]["VC"]
+                coefs[1:] = BTFIT[channel]
+            elif cal_type == 2:
+                # effective radiances
+                mode = CAL_BT_EFFECTIVE
+                coefs[0] = CALIB[self.platform_id][channel]["VC"]
+                coefs[1] = CALIB[self.platform_id][channel]["ALPHA"]
+                coefs[2] = CALIB[self.platform_id][channel]["BETA"]
+            else:
+                raise NotImplementedError('Unknown calibration type')
 
-        return dataset
+        params = (gain, offset, mode, coefs)
+        self._calib_params[(channel, calibration)] = params
+        return params
 
     def calibrate(self, data, dataset_id):
         """Calibrate the data."""
@@ -471,23 +628,14 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
         calibration = dataset_id['calibration']
         channel = dataset_id['name']
 
-        # even though all the channels may not be present in the file,
-        # the header does have calibration coefficients for all the channels
-        # hence, this channel index needs to refer to full channel list
-        i = list(CHANNEL_NAMES.values()).index(channel)
+        i = self._channel_index[channel]
 
         if calibration == 'counts':
             return data
 
         if calibration in ['radiance', 'reflectance', 'brightness_temperature']:
-            # determine the required calibration coefficients to use
-            # for the Level 1.5 Header
-            if (self.calib_mode.upper() != 'GSICS' and self.calib_mode.upper() != 'NOMINAL'):
-                raise NotImplementedError(
-                    'Unknown Calibration mode : Please check')
-
             # NB GSICS doesn't have calibration coeffs for VIS channels
-            if (self.calib_mode.upper() != 'GSICS' or channel in VIS_CHANNELS):
+            if (self._calib_mode != CALIB_MODE_GSICS or channel in VIS_CHANNELS):
                 coeffs = data15hdr[
                     'RadiometricProcessing']['Level15ImageCalibration']
                 gain = coeffs['CalSlope'][i]
@@ -498,7 +646,9 @@ class NativeMSGFileHandler(BaseFileHandler, SEVIRICalibrationHandler):
                 gain = coeffs['GSICSCalCoeff'][i]
                 offset = coeffs['GSICSOffsetCount'][i]
                 offset = offset * gain
-            res = self._convert_to_radiance(data, gain, offset)
+            # plain floats keep float32 input data from being promoted
+            # to float64 by the numpy scalar coefficients
+            res = self._convert_to_radiance(data, float(gain), float(offset))
 
         if calibration == 'reflectance':
             solar_irradiance = CALIB[self.platform_id][channel]["F"]
@@ -517,9 +667,7 @@ def get_available_channels(header):
     """Get the available channels from the header information."""
     chlist_str = header['15_SECONDARY_PRODUCT_HEADER'][
         'SelectedBandIDs']['Value']
-    retv = {}
-
-    for idx, char in zip(range(12), chlist_str):
-        retv[CHANNEL_NAMES[idx + 1]] = (char == 'X')
+    mask = np.fromiter((char == 'X' for char in chlist_str),
+                       dtype=bool, count=len(CHANNEL_NAMES))
 
-    return retv
+    return dict(zip(CHANNEL_NAMES.values(), mask))
@@ -19,7 +19,11 @@
 
 import unittest
 import numpy as np
-from satpy.readers.seviri_base import dec10216, chebyshev, get_cds_time
+import dask.array as da
+from satpy.readers.seviri_base import (
+    dec10216, chebyshev, get_cds_time, unpack_and_calibrate,
+    _unpack_and_calibrate_numpy, CAL_COUNTS, CAL_RADIANCE, CAL_REFLECTANCE,
+    CAL_BT_SPECTRAL, CAL_BT_EFFECTIVE)
 
 
 def chebyshev4(c, x, domain):
@@ -39,6 +43,35 @@ class SeviriBaseTest(unittest.TestCase):
         exp = np.array([4,  16,  64, 257], dtype=np.uint16)
         self.assertTrue(np.all(res == exp))
 
+    def test_unpack_and_calibrate(self):
+        """Test the fused 10-bit decode and calibration."""
+        inbuf = np.array([[255, 255, 255, 255, 255],
+                          [0, 0, 1, 1, 1]], dtype=np.uint8)
+        gain, offset = 0.1, -1.0
+        modes_and_coefs = [
+            (CAL_COUNTS, [0., 0., 0., 0.]),
+            (CAL_RADIANCE, [0., 0., 0., 0.]),
+            (CAL_REFLECTANCE, [20.76, 0., 0., 0.]),
+            (CAL_BT_SPECTRAL, [930.647, -7.39277e-05, 1.0328898, -3.29674]),
+            (CAL_BT_EFFECTIVE, [930.647, 0.9983, 0.625, 0.]),
+        ]
+        for mode, coefs in modes_and_coefs:
+            exp = _unpack_and_calibrate_numpy(inbuf, gain, offset, mode,
+                                              np.array(coefs))
+            res = unpack_and_calibrate(inbuf, gain, offset, mode, coefs)
+            self.assertEqual(res.dtype, np.float32)
+            np.testing.assert_allclose(res, exp, rtol=1e-6)
+            res = unpack_and_calibrate(da.from_array(inbuf, chunks=(1, 5)),
+                                       gain, offset, mode, coefs)
+            np.testing.assert_allclose(res.compute(), exp, rtol=1e-6)
+
+        # zero counts become NaN, other counts survive unscaled
+        res = unpack_and_calibrate(inbuf, gain, offset, CAL_COUNTS,
+                                   [0., 0., 0., 0.])
+        np.testing.assert_array_equal(
+            res, np.array([[1023., 1023., 1023., 1023.],
+                           [np.nan, np.nan, 64., 257.]], dtype=np.float32))
+
     def test_chebyshev(self):
         coefs = [1, 2, 3, 4]
         time = 123
@@ -19,13 +19,17 @@
 
 import unittest
 from unittest import mock
+import dask.array as da
 import numpy as np
 import xarray as xr
 
+from satpy.readers.seviri_base import dec10216
 from satpy.readers.seviri_l1b_native import (
+    CALIB_MODE_NOMINAL,
     NativeMSGFileHandler,
     get_available_channels,
 )
+from satpy.readers.seviri_l1b_native_hdr import native_header
 
 
 from satpy.tests.utils import make_dataid
@@ -411,12 +415,16 @@ class TestNativeMSGArea(unittest.TestCase):
         trailer = self.create_test_trailer(is_rapid_scan)
         expected_area_def = test_dict['expected_area_def']
 
-        with mock.patch('satpy.readers.seviri_l1b_native.np.fromfile') as fromfile:
-            fromfile.return_value = header
+        with mock.patch('satpy.readers.seviri_l1b_native.np.frombuffer') as frombuffer, \
+                mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler.'
+                           '_get_memmap') as _get_memmap:
+            frombuffer.return_value = header
+            _get_memmap.return_value = np.arange(3)
             with mock.patch('satpy.readers.seviri_l1b_native.recarray2dict') as recarray2dict:
                 recarray2dict.side_effect = (lambda x: x)
-                with mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler._get_memmap') as _get_memmap:
-                    _get_memmap.return_value = np.arange(3)
+                with mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler.'
+                                '_get_line_data') as _get_line_data:
+                    _get_line_data.return_value = {}
                     with mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler._read_trailer'):
 
                         fh = NativeMSGFileHandler(None, {}, None)
@@ -548,6 +556,124 @@ class TestNativeMSGArea(unittest.TestCase):
         self.assertEqual(calculated.proj_id,  expected['Projection ID'])
 
 
+class TestNativeMSGDataset(unittest.TestCase):
+    """Test NativeMSGFileHandler.get_dataset with synthetic packed data."""
+
+    @staticmethod
+    def create_test_handler():
+        """Create a file handler with mocked IO around synthetic line data."""
+        fh = NativeMSGFileHandler.__new__(NativeMSGFileHandler)
+        fh.platform_id = 324
+        fh.calib_mode = 'nominal'
+        fh._calib_mode = CALIB_MODE_NOMINAL
+        fh.output_dtype = np.dtype(np.float32)
+        fh._channel_index = {name: i for i, name
+                             in enumerate(CHANNEL_INDEX_LIST)}
+        fh._calib_params = {}
+        fh._dataset_cache = {}
+        fh.mda = {
+            'number_of_lines': 4,
+            'number_of_columns': 8,
+            'hrv_number_of_lines': 12,
+            'hrv_number_of_columns': 8,
+            'available_channels': {'HRV': True},
+            'channel_list': ['VIS006', 'IR_108', 'HRV'],
+            'platform_name': 'Meteosat-11',
+            'projection_parameters': {'ssp_longitude': 0.0,
+                                      'h': 35785831.0},
+        }
+        fh.header = {'15_DATA_HEADER': {
+            'RadiometricProcessing': {'Level15ImageCalibration': {
+                'CalSlope': [0.1] * 12, 'CalOffset': [-1.0] * 12}},
+            'ImageDescription': {'Level15ImageProduction': {
+                'PlannedChanProcessing': [2] * 12}},
+        }}
+        fh._data_dtype = fh._get_data_dtype()
+
+        rng = np.random.RandomState(42)
+        raw = rng.randint(
+            0, 256, (4, fh._data_dtype.itemsize)).astype(np.uint8)
+        fh._memmap = np.concatenate(
+            [np.zeros(native_header.itemsize, dtype=np.uint8), raw.ravel()])
+        with mock.patch('satpy.readers.seviri_l1b_native.CHUNK_SIZE', 2):
+            fh.line_data = fh._get_line_data()
+
+        return fh, raw
+
+    def test_get_dataset(self):
+        """Test the mask, dtype and laziness of the loaded data."""
+        fh, raw = self.create_test_handler()
+        dataset_info = {'units': 'K', 'wavelength': (9.8, 10.8, 11.8),
+                        'standard_name': 'toa_brightness_temperature'}
+
+        counts = fh.get_dataset(make_dataid(name='IR_108',
+                                            calibration='counts'),
+                                dataset_info)
+        # the full chain must stay lazy and chunked for parallel loading
+        self.assertIsInstance(counts.data, da.Array)
+        self.assertEqual(len(counts.data.chunks[0]), 2)
+
+        # check counts against the structured dtype interpretation
+        i = fh.mda['channel_list'].index('IR_108')
+        packed = raw.ravel().view(fh._data_dtype)['visir']['line_data'][:, i]
+        expected = dec10216(packed.flatten()).reshape((4, 8)).astype(np.float32)
+        expected[expected == 0] = np.nan
+        np.testing.assert_array_equal(counts.values, expected)
+        self.assertEqual(counts.dtype, np.float32)
+
+        # brightness temperature matches calibrating the counts separately
+        bt = fh.get_dataset(make_dataid(name='IR_108',
+                                        calibration='brightness_temperature'),
+                            dataset_info)
+        expected_bt = fh.calibrate(
+            xr.DataArray(expected, dims=['y', 'x']),
+            make_dataid(name='IR_108', calibration='brightness_temperature'))
+        np.testing.assert_allclose(bt.values, expected_bt.values, rtol=1e-5)
+        self.assertEqual(bt.dtype, np.float32)
+
+    def test_get_dataset_output_dtype(self):
+        """Test loading with a reduced-precision output dtype."""
+        fh, raw = self.create_test_handler()
+        fh.output_dtype = np.dtype(np.float16)
+        dataset_info = {'units': 'K', 'wavelength': (9.8, 10.8, 11.8),
+                        'standard_name': 'toa_brightness_temperature'}
+
+        bt = fh.get_dataset(make_dataid(name='IR_108',
+                                        calibration='brightness_temperature'),
+                            dataset_info)
+        self.assertIsInstance(bt.data, da.Array)
+        self.assertEqual(bt.dtype, np.float16)
+
+    def test_get_dataset_shares_decode(self):
+        """Test that sibling loads of a dataset share one dask graph."""
+        fh, raw = self.create_test_handler()
+        dataset_info = {'units': 'K', 'wavelength': (9.8, 10.8, 11.8),
+                        'standard_name': 'toa_brightness_temperature'}
+
+        dataset_id = make_dataid(name='IR_108', calibration='counts')
+        first = fh.get_dataset(dataset_id, dataset_info)
+        second = fh.get_dataset(dataset_id, dataset_info)
+        self.assertIs(first.data, second.data)
+
+    def test_get_dataset_hrv(self):
+        """Test that the HRV sub-lines are interleaved in line order."""
+        fh, raw = self.create_test_handler()
+        dataset_info = {'units': '1', 'wavelength': (0.5, 0.7, 0.9),
+                        'standard_name': 'counts'}
+
+        hrv = fh.get_dataset(make_dataid(name='HRV', calibration='counts'),
+                             dataset_info)
+        self.assertEqual(hrv.shape, (12, 8))
+
+        packed = raw.ravel().view(fh._data_dtype)['hrv']['line_data']
+        for layer in range(3):
+            expected = dec10216(
+                np.ascontiguousarray(packed[:, layer]).flatten()
+            ).reshape((4, 8)).astype(np.float32)
+            expected[expected == 0] = np.nan
+            np.testing.assert_array_equal(hrv.values[layer::3], expected)
+
+
 class TestNativeMSGCalibrationMode(unittest.TestCase):
     """Test NativeMSGFileHandler.get_area_extent.
 
@@ -674,12 +800,16 @@ class TestNativeMSGCalibrationMode(unittest.TestCase):
         is_rapid_scan = test_dict['is_rapid_scan']
         header = self.create_test_header(earth_model, dataset_id, is_full_disk, is_rapid_scan)
 
-        with mock.patch('satpy.readers.seviri_l1b_native.np.fromfile') as fromfile:
-            fromfile.return_value = header
+        with mock.patch('satpy.readers.seviri_l1b_native.np.frombuffer') as frombuffer, \
+                mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler.'
+                           '_get_memmap') as _get_memmap:
+            frombuffer.return_value = header
+            _get_memmap.return_value = np.arange(3)
             with mock.patch('satpy.readers.seviri_l1b_native.recarray2dict') as recarray2dict:
                 recarray2dict.side_effect = (lambda x: x)
-                with mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler._get_memmap') as _get_memmap:
-                    _get_memmap.return_value = np.arange(3)
+                with mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler.'
+                                '_get_line_data') as _get_line_data:
+                    _get_line_data.return_value = {}
                     with mock.patch('satpy.readers.seviri_l1b_native.NativeMSGFileHandler._read_trailer'):
                         # Create an instance of the native msg reader
                         # with the calibration mode to test
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Satpy developers
+#
+# This file is part of satpy.
+#
+# satpy is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# satpy is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# satpy.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmark the SEVIRI 10-bit decoders.
+
+Times the numpy implementation against the numba kernel (if numba is
+installed) on a full-disk sized VISIR channel, plus the fused
+unpack-and-calibrate kernel. Use this to check that the numba kernel
+auto-vectorizes on the target machine before relying on it in
+production; on machines where it does not, the numbers here will come
+out close to the numpy implementation.
+
+"""
+
+import timeit
+
+import numpy as np
+
+from satpy.readers.seviri_base import (_dec10216, _dec10216_numpy,
+                                       _unpack_and_calibrate,
+                                       _unpack_and_calibrate_numpy,
+                                       CAL_RADIANCE)
+
+N_LINES = 3712
+N_COLS_BYTES = 4640  # 3712 columns packed at 10 bit
+
+
+def _report(label, seconds, nbytes):
+    print("%-30s %8.1f ms  %8.2f GB/s"
+          % (label, seconds * 1e3, nbytes / seconds / 1e9))
+
+
+def main():
+    """Run the benchmark."""
+    rng = np.random.RandomState(42)
+    packed = rng.randint(0, 256, (N_LINES, N_COLS_BYTES)).astype(np.uint8)
+    flat = np.ascontiguousarray(packed.ravel())
+    coefs = np.zeros(4)
+
+    np.testing.assert_array_equal(_dec10216(flat), _dec10216_numpy(flat))
+
+    number = 10
+    t = timeit.timeit(lambda: _dec10216_numpy(flat), number=number) / number
+    _report("dec10216 numpy", t, flat.nbytes)
+
+    if _dec10216 is not _dec10216_numpy:
+        _dec10216(flat)  # warm up the JIT
+        t = timeit.timeit(lambda: _dec10216(flat), number=number) / number
+        _report("dec10216 numba", t, flat.nbytes)
+
+    t = timeit.timeit(
+        lambda: _unpack_and_calibrate_numpy(packed, 0.2, -10.0,
+                                            CAL_RADIANCE, coefs),
+        number=number) / number
+    _report("unpack+calibrate numpy", t, packed.nbytes)
+
+    if _unpack_and_calibrate is not _unpack_and_calibrate_numpy:
+        _unpack_and_calibrate(packed, 0.2, -10.0, CAL_RADIANCE, coefs)
+        t = timeit.timeit(
+            lambda: _unpack_and_calibrate(packed, 0.2, -10.0,
+                                          CAL_RADIANCE, coefs),
+            number=number) / number
+        _report("unpack+calibrate numba", t, packed.nbytes)
+
+
+if __name__ == '__main__':
+    main()